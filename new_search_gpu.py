@@ -1,68 +1,220 @@
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score
 import numpy as np
 import pandas as pd
 import duckdb
-import bisect
 import os
 import torch
 from functools import reduce
 from torch.utils.data import DataLoader, TensorDataset
 import psutil
-import copy
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from itertools import combinations
 
+# Copy-on-write makes shallow DataFrame copies safe: blocks are shared until a
+# write actually happens, so register_buyer no longer needs deep copies
+pd.set_option("mode.copy_on_write", True)
+
+try:
+    import numba
+except ImportError:
+    # numba is an optional accelerator; everything falls back to duckdb/NumPy
+    numba = None
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _group_sums_kernel(codes, values, num_groups):
+        # Bincount-style accumulator: one pass over the rows, native code.
+        # codes < 0 mark rows whose join key falls outside the domain, which
+        # the SQL path drops via its inner join onto the domain product.
+        sums = np.zeros((num_groups, values.shape[1]), dtype=np.float64)
+        counts = np.zeros(num_groups, dtype=np.int64)
+        for i in range(codes.shape[0]):
+            code = codes[i]
+            if code < 0:
+                continue
+            counts[code] += 1
+            for j in range(values.shape[1]):
+                # NaN cells are skipped like pandas sum() / SQL SUM over NULL;
+                # counts stay raw row counts to match groupby size semantics
+                v = values[i, j]
+                if not np.isnan(v):
+                    sums[code, j] += v
+        return sums, counts
+
+    @numba.njit(cache=True)
+    def _segment_mean_map_kernel(codes, values, buyer_codes, num_groups):
+        # Fused per-group mean plus buyer-row mapping for _update_residual:
+        # one pass over the seller rows, one over the buyer rows, and the
+        # unmatched-row fill (mean of the matched rows) without extra arrays
+        sums = np.zeros(num_groups, dtype=np.float64)
+        counts = np.zeros(num_groups, dtype=np.int64)
+        for i in range(codes.shape[0]):
+            # codes < 0 mark rows with a NaN join key, which the groupby
+            # baseline dropped; without the guard they wrap to the last group
+            if codes[i] < 0:
+                continue
+            v = values[i]
+            if not np.isnan(v):
+                sums[codes[i]] += v
+                counts[codes[i]] += 1
+        out = np.empty(buyer_codes.shape[0], dtype=np.float64)
+        matched_sum = 0.0
+        matched_n = 0
+        for i in range(buyer_codes.shape[0]):
+            code = buyer_codes[i]
+            if code >= 0 and counts[code] > 0:
+                out[i] = sums[code] / counts[code]
+                matched_sum += out[i]
+                matched_n += 1
+            else:
+                out[i] = np.nan
+        if matched_n > 0:
+            fill = matched_sum / matched_n
+            for i in range(out.shape[0]):
+                if np.isnan(out[i]):
+                    out[i] = fill
+        return out
+
+
+def _new_feature_index(end_pos, seller_id, offset):
+    # feature_index_mapping entries are kept as parallel int64 arrays (SoA)
+    # rather than a list of tuples, so lookups are a single searchsorted over
+    # a contiguous key array instead of pointer-chasing tuple objects
+    return {"ends": np.array([end_pos], dtype=np.int64),
+            "ids": np.array([seller_id], dtype=np.int64),
+            "offsets": np.array([offset], dtype=np.int64)}
+
+
+def _insert_feature_index(entry, end_pos, seller_id, offset):
+    # Inserts are append-mostly in monotonic position order
+    pos = int(np.searchsorted(entry["ends"], end_pos))
+    entry["ends"] = np.insert(entry["ends"], pos, end_pos)
+    entry["ids"] = np.insert(entry["ids"], pos, seller_id)
+    entry["offsets"] = np.insert(entry["offsets"], pos, offset)
+
+
+def _quote_ident(name):
+    # Feature columns carry seller/join-key prefixes with arbitrary characters,
+    # so always double-quote identifiers that go into duckdb SQL
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _save_tensor(tensor, path):
+    # Sketches are dense contiguous tensors with trivial metadata, so spill the
+    # raw buffer with np.save instead of torch.save (which pickles the object
+    # graph and computes a CRC32 over every chunk, well below NVMe throughput)
+    np.save(path, tensor.detach().contiguous().cpu().numpy(), allow_pickle=False)
+
+
+def _load_tensor(path):
+    # Copy-on-write mmap: pages are faulted in on demand and served from the
+    # OS page cache on repeated access, instead of eagerly reading the whole
+    # batch from disk on every call
+    return torch.from_numpy(np.load(path, mmap_mode='c', allow_pickle=False))
+
 
 def cleanup(*args):
+    # Dropping the references is enough: PyTorch's caching allocator reuses the
+    # freed blocks directly. Calling torch.cuda.empty_cache() here would sync
+    # the device and hand the blocks back to the driver, forcing a fresh
+    # cudaMalloc on the very next allocation in the search loop.
     for arg in args:
         if isinstance(arg, torch.Tensor):
             del arg
+
+
+def hard_cleanup(*args):
+    # Only for callers that genuinely need to shrink the reserved pool, e.g.
+    # when torch.cuda.memory_reserved() is close to the device limit
+    cleanup(*args)
     torch.cuda.empty_cache()
 
 
 def linear_regression_residuals(df, X_columns, Y_column, adjusted=False):
 
-    from sklearn.linear_model import LinearRegression
-    from sklearn.metrics import r2_score
-
     # Ensure that X_columns exist in the dataframe
     if not all(item in df.columns for item in X_columns):
         raise ValueError('Not all specified X_columns are in the dataframe.')
     if Y_column not in df.columns:
         raise ValueError('The Y_column is not in the dataframe.')
 
-    # Prepare the feature matrix X by selecting the X_columns and adding an intercept term
-    X = df[X_columns].values
-    X = np.hstack([np.ones((X.shape[0], 1)), X])  # Add intercept term
-    # Extract the target variable vector Y
-    Y = df[Y_column].values
-
-    # Calculate theta using the pseudo-inverse
-    # theta = np.linalg.pinv(X.T @ X) @ X.T @ Y
-    # Make predictions
-    # Y_pred = X @ theta
-    model = LinearRegression().fit(X, Y)
-    Y_pred = model.predict(X)
-    # Calculate residuals
-    residuals = Y - Y_pred
+    # Prepare the feature matrix X and the target variable vector Y.
+    # Mean-center both instead of stacking an explicit intercept column:
+    # the residuals and R² are invariant and we skip the hstack copy.
+    X = df[X_columns].values.astype(np.float64, copy=False)
+    Y = df[Y_column].values.astype(np.float64, copy=False)
+    X_centered = X - X.mean(axis=0)
+    Y_centered = Y - Y.mean()
+
+    # Solve the normal equations directly instead of going through sklearn's
+    # LinearRegression wrapper (validation + copies + gelsd dominate for small p)
+    XtX = X_centered.T @ X_centered
+    XtY = X_centered.T @ Y_centered
+    try:
+        theta = np.linalg.solve(XtX, XtY)
+    except np.linalg.LinAlgError:
+        # Singular normal equations, fall back to least squares
+        theta, *_ = np.linalg.lstsq(X_centered, Y_centered, rcond=None)
+    # Calculate residuals (the centered fit absorbs the intercept)
+    residuals = Y_centered - X_centered @ theta
     # Add residuals to the dataframe
     df['residuals'] = residuals
 
     # Calculate R-squared
     SS_res = (residuals ** 2).sum()
-    SS_tot = ((Y - np.mean(Y)) ** 2).sum()
+    SS_tot = (Y_centered ** 2).sum()
     R_squared = 1 - SS_res / SS_tot
-    
+
     if adjusted:
         # Calculate Adjusted R-squared
         n = X.shape[0]  # Number of observations
-        p = X.shape[1] - 1  # Number of predictors, excluding intercept
+        p = X.shape[1]  # Number of predictors, excluding intercept
         R_squared = 1 - ((1 - R_squared) * (n - 1)) / (n - p - 1)
     return df, R_squared
 
+
+def linear_regression_residuals_batched(X_batch, Y_batch, ridge=1e-8):
+    """
+    Batched OLS on the GPU. Instead of fitting one regression per (X, Y) pair in
+    Python, stack B problems into X_batch (B, n, p) and Y_batch (B, n) and solve
+    them with a single batched kernel so cuSOLVER handles all B fits in one launch.
+
+    @param X_batch: a (B, n, p) tensor of feature matrices (no intercept column needed)
+    @param Y_batch: a (B, n) tensor of targets
+    @param ridge: a tiny diagonal regularizer for stability of the normal equations
+
+    @return: a tuple (residuals, R_squared) of tensors with shapes (B, n) and (B,).
+             Both stay on the input device; callers only sync when they need a scalar.
+    """
+    # Mean-center so the intercept is absorbed, same as linear_regression_residuals
+    X_centered = X_batch - X_batch.mean(dim=1, keepdim=True)
+    Y_centered = Y_batch - Y_batch.mean(dim=1, keepdim=True)
+
+    p = X_centered.shape[-1]
+    if p <= 32:
+        # Small p: normal equations with a tiny ridge are faster than batched QR
+        XtX = X_centered.transpose(-1, -2) @ X_centered
+        XtX += ridge * torch.eye(p, dtype=XtX.dtype, device=XtX.device)
+        XtY = X_centered.transpose(-1, -2) @ Y_centered.unsqueeze(-1)
+        theta = torch.linalg.solve(XtX, XtY)
+    else:
+        theta = torch.linalg.lstsq(X_centered, Y_centered.unsqueeze(-1)).solution
+
+    residuals = Y_centered - (X_centered @ theta).squeeze(-1)
+    SS_res = (residuals ** 2).sum(dim=-1)
+    SS_tot = (Y_centered ** 2).sum(dim=-1)
+    R_squared = 1 - SS_res / SS_tot
+    return residuals, R_squared
+
 class SketchLoader:
     def __init__(self, batch_size, device='cpu', disk_dir='sketches/', is_buyer=False):
         self.batch_size = batch_size
+        # Seller batches are fused into one (3, tensor_width, batch_size)
+        # tensor per batch (layer 0 = 1, layer 1 = x, layer 2 = x_x) so every
+        # assemble / transfer / spill touches one buffer instead of three.
+        # Buyer sketches keep separate dicts because the 1 and x_y tensors
+        # have different widths.
+        self.sketch_batch = {}
         self.sketch_1_batch = {}
         self.sketch_x_batch = {}
         self.sketch_x_x_batch = {}
@@ -72,117 +224,221 @@ class SketchLoader:
         self.num_batches = 0
         self.disk_dir = disk_dir
 
-    def load_sketches(self, seller_1, seller_x, seller_x_x, feature_index_map, seller_id, 
-                      cur_df_offset=0, to_disk=False, seller_x_y=None):
-        
+        # Chunks appended to the currently open (last) batch are accumulated in
+        # this list and concatenated exactly once when the batch closes (or is
+        # first read). Growing a batch with torch.cat per registration would
+        # re-copy the whole batch every time, i.e. O(n^2) memory traffic.
+        self._pending_batch_id = None
+        self._pending = []
+        self._pending_fill = 0
+
+        # Mmapped host tensors for spilled batches, keyed by batch_id
+        self._disk_cache = {}
+
+        # Storage pool for assembled batch tensors, keyed by (shape, dtype).
+        # Spilled batches release their buffers here so the next batch reuses
+        # them instead of churning through fresh allocations.
+        self._batch_pool = {}
+
+        # Dedicated stream for host-to-device copies so pinned-memory transfers
+        # can overlap with compute on the default stream
+        if device == 'cuda' and torch.cuda.is_available():
+            self._copy_stream = torch.cuda.Stream()
+        else:
+            self._copy_stream = None
+
+    def _to_device(self, tensor):
+        # non_blocking is a no-op for pageable memory, but _calibrate hands us
+        # pinned tensors when the target device is cuda
+        return tensor.to(self.device, non_blocking=True)
+
+    def _open_batch(self, batch_id):
+        self._pending_batch_id = batch_id
+        self._pending = []
+        self._pending_fill = 0
+
+    def _append_pending(self, seller_1, seller_x, seller_x_x):
+        # Fuse the three sketch layers into one (3, width, cols) chunk; the
+        # count layer is cast to the sketch dtype so the batch is homogeneous
+        self._pending.append(torch.stack((seller_1.to(seller_x.dtype),
+                                          seller_x, seller_x_x)))
+        self._pending_fill += seller_x.size(1)
+
+    def _acquire(self, shape, dtype):
+        bucket = self._batch_pool.get((shape, dtype))
+        if bucket:
+            return bucket.pop()
+        tensor = torch.empty(shape, dtype=dtype,
+                             pin_memory=self._copy_stream is not None)
+        # Only buffers we allocated ourselves may be recycled; single-chunk
+        # batches alias caller memory and must never be written over
+        tensor._from_batch_pool = True
+        return tensor
+
+    def _release(self, tensor):
+        if tensor is not None and getattr(tensor, "_from_batch_pool", False):
+            self._batch_pool.setdefault((tuple(tensor.shape), tensor.dtype), []).append(tensor)
+
+    def _assemble(self, pieces):
+        if len(pieces) == 1:
+            return pieces[0]
+        width = pieces[0].size(1)
+        total = sum(piece.size(2) for piece in pieces)
+        out = self._acquire((3, width, total), pieces[0].dtype)
+        offset = 0
+        for piece in pieces:
+            out[:, :, offset:offset + piece.size(2)].copy_(piece)
+            offset += piece.size(2)
+        return out
+
+    def _flush_pending(self):
+        # Materialize the open batch into a (pooled) buffer and keep the result
+        # as the sole pending chunk so later appends still amortize to O(1)
+        if self._pending_batch_id is None or not self._pending:
+            return
+        batch_id = self._pending_batch_id
+        fused_batch = self._assemble(self._pending)
+        old = self.sketch_batch.get(batch_id)
+        if old is not None and old is not fused_batch:
+            self._release(old)
+        self.sketch_batch[batch_id] = fused_batch
+        self._pending = [fused_batch]
+
+    def load_sketches(self, seller_1, seller_x, seller_x_x, feature_index_map, seller_id,
+                      cur_df_offset=0, to_disk=False, seller_x_y=None, seller_index=None):
+
+        def record_seller(batch_id, offset):
+            # Keep the first placement for each seller so lookups match what a
+            # linear scan of feature_index_map would have returned
+            if seller_index is not None and seller_id not in seller_index:
+                seller_index[seller_id] = (batch_id, offset)
+
         if self.is_buyer:
             # Each buyer sketch will only have one column with respect to each join key
             # TODO: Now assume each buyer sketch is small
             if seller_x_y is not None:
-                self.sketch_1_batch[0] = seller_1[:, 0:1].to(self.device)
-                self.sketch_x_y_batch[0] = seller_x_y.to(self.device)
+                self.sketch_1_batch[0] = self._to_device(seller_1[:, 0:1])
+                self.sketch_x_y_batch[0] = self._to_device(seller_x_y)
             else:
-                self.sketch_1_batch[0] = seller_1.to(self.device)
-            self.sketch_x_batch[0] = seller_x.to(self.device)
-            self.sketch_x_x_batch[0] = seller_x_x.to(self.device)
-            feature_index_map[0] = [(0, seller_id, 0)]
+                self.sketch_1_batch[0] = self._to_device(seller_1)
+            self.sketch_x_batch[0] = self._to_device(seller_x)
+            self.sketch_x_x_batch[0] = self._to_device(seller_x_x)
+            feature_index_map[0] = _new_feature_index(0, seller_id, 0)
+            record_seller(0, 0)
             return
         
-        if not self.sketch_x_batch:
-            # If the dictionary is empty, start with batch number 0
-            self.sketch_1_batch[0] = seller_1[:, :min(
-                self.batch_size, seller_1.size(1))]
-            remaining_seller_1 = seller_1[:, self.batch_size:]
-            self.sketch_x_batch[0] = seller_x[:, :min(
-                self.batch_size, seller_x.size(1))]
-            remaining_seller_x = seller_x[:, self.batch_size:]
-            self.sketch_x_x_batch[0] = seller_x_x[:, :min(
-                self.batch_size, seller_x_x.size(1))]
-            remaining_seller_x_x = seller_x_x[:, self.batch_size:]
-            feature_index_map[0] = [(0, seller_id, 0)]
-            cur_df_offset = self.batch_size
-        else:
-            # Find the last batch number
-            last_batch_num = max(self.sketch_x_batch.keys())
-            last_batch_1 = self.sketch_1_batch[last_batch_num]
-            last_batch_x = self.sketch_x_batch[last_batch_num]
-            last_batch_x_x = self.sketch_x_x_batch[last_batch_num]
-
-            # Calculate remaining space in the last batch
-            remaining_space = self.batch_size - last_batch_x.size(1)
-
-            # Append as much as possible to the last batch
-            if remaining_space > 0:
-                amount_to_append = min(remaining_space, seller_x.size(1))
-                self.sketch_1_batch[last_batch_num] = torch.cat(
-                    [last_batch_1, seller_1[:, :amount_to_append]], dim=1)
-                self.sketch_x_batch[last_batch_num] = torch.cat(
-                    [last_batch_x, seller_x[:, :amount_to_append]], dim=1)
-                self.sketch_x_x_batch[last_batch_num] = torch.cat(
-                    [last_batch_x_x, seller_x_x[:, :amount_to_append]], dim=1)
+        # Iteratively append one slice per pass; recursion here would add a
+        # Python frame per spilled chunk and risk RecursionError on wide sellers
+        while True:
+            if self.num_batches == 0:
+                # No batch opened yet, start with batch number 0
+                self._open_batch(0)
+                amount_to_append = min(self.batch_size, seller_x.size(1))
+                self._append_pending(seller_1[:, :amount_to_append],
+                                     seller_x[:, :amount_to_append],
+                                     seller_x_x[:, :amount_to_append])
                 remaining_seller_1 = seller_1[:, amount_to_append:]
                 remaining_seller_x = seller_x[:, amount_to_append:]
                 remaining_seller_x_x = seller_x_x[:, amount_to_append:]
-                bisect.insort(feature_index_map[last_batch_num], (last_batch_x.size(
-                    1), seller_id, cur_df_offset))
-                cur_df_offset += remaining_space
+                feature_index_map[0] = _new_feature_index(0, seller_id, 0)
+                record_seller(0, 0)
+                cur_df_offset = self.batch_size
+                self.num_batches = 1
             else:
-                # No space left in the last batch, start a new batch
-                last_batch_num += 1
-                # feature_index_map[last_batch_num] =
-                self.sketch_1_batch[last_batch_num] = seller_1[:, :min(
-                    self.batch_size, seller_1.size(1))]
-                self.sketch_x_batch[last_batch_num] = seller_x[:, :min(
-                    self.batch_size, seller_x.size(1))]
-                self.sketch_x_x_batch[last_batch_num] = seller_x_x[:, :min(
-                    self.batch_size, seller_x_x.size(1))]
-                remaining_seller_1 = seller_1[:, self.batch_size:]
-                remaining_seller_x = seller_x[:, self.batch_size:]
-                remaining_seller_x_x = seller_x_x[:, self.batch_size:]
-                feature_index_map[last_batch_num] = [
-                    (0, seller_id, cur_df_offset)]
-                cur_df_offset += self.batch_size
-        self.num_batches = len(self.sketch_x_batch.keys())
-
-        # Recursively append the remaining parts
-        # if there is remaining part, that means the previous batch is occupied 
-        if remaining_seller_x.size(1) > 0:           
+                last_batch_num = self._pending_batch_id
+
+                # Calculate remaining space in the last batch
+                remaining_space = self.batch_size - self._pending_fill
+
+                # Append as much as possible to the last batch
+                if remaining_space > 0:
+                    amount_to_append = min(remaining_space, seller_x.size(1))
+                    insert_pos = self._pending_fill
+                    self._append_pending(seller_1[:, :amount_to_append],
+                                         seller_x[:, :amount_to_append],
+                                         seller_x_x[:, :amount_to_append])
+                    remaining_seller_1 = seller_1[:, amount_to_append:]
+                    remaining_seller_x = seller_x[:, amount_to_append:]
+                    remaining_seller_x_x = seller_x_x[:, amount_to_append:]
+                    _insert_feature_index(feature_index_map[last_batch_num],
+                                          insert_pos, seller_id, cur_df_offset)
+                    record_seller(last_batch_num, cur_df_offset)
+                    cur_df_offset += remaining_space
+                else:
+                    # No space left in the last batch, close it and start a new batch
+                    self._flush_pending()
+                    last_batch_num += 1
+                    self._open_batch(last_batch_num)
+                    amount_to_append = min(self.batch_size, seller_x.size(1))
+                    self._append_pending(seller_1[:, :amount_to_append],
+                                         seller_x[:, :amount_to_append],
+                                         seller_x_x[:, :amount_to_append])
+                    remaining_seller_1 = seller_1[:, self.batch_size:]
+                    remaining_seller_x = seller_x[:, self.batch_size:]
+                    remaining_seller_x_x = seller_x_x[:, self.batch_size:]
+                    feature_index_map[last_batch_num] = _new_feature_index(
+                        0, seller_id, cur_df_offset)
+                    record_seller(last_batch_num, cur_df_offset)
+                    cur_df_offset += self.batch_size
+                    self.num_batches += 1
+
+            # if there is remaining part, that means the previous batch is occupied
+            if remaining_seller_x.size(1) == 0:
+                break
+
             # Create the directory if it doesn't exist
             if not os.path.exists(self.disk_dir):
                 os.makedirs(self.disk_dir)
             # Save the tensor
             if to_disk:
                 prev_batch_id = self.num_batches-1
-                sketch_1_batch = self.sketch_1_batch[prev_batch_id]
-                sketch_x_batch = self.sketch_x_batch[prev_batch_id]
-                sketch_x_x_batch = self.sketch_x_x_batch[prev_batch_id]
-
-                torch.save(sketch_1_batch, os.path.join(self.disk_dir, "sketch_1_" + str(prev_batch_id) + ".pt"))
-                torch.save(sketch_x_batch, os.path.join(self.disk_dir, "sketch_x_" + str(prev_batch_id) + ".pt"))
-                torch.save(sketch_x_x_batch, os.path.join(self.disk_dir, "sketch_x_x_" + str(prev_batch_id) + ".pt"))
-                del self.sketch_1_batch[prev_batch_id]
-                del self.sketch_x_batch[prev_batch_id]
-                del self.sketch_x_x_batch[prev_batch_id]
-            self.load_sketches(remaining_seller_1, remaining_seller_x, remaining_seller_x_x,
-                               feature_index_map, seller_id, cur_df_offset) 
-            
+                self._flush_pending()
+                _save_tensor(self.sketch_batch[prev_batch_id],
+                             os.path.join(self.disk_dir, "sketch_batch_" + str(prev_batch_id) + ".npy"))
+                # Recycle the spilled buffer for the next batch instead of
+                # handing it back to the allocator
+                self._release(self.sketch_batch.pop(prev_batch_id))
+                # The spilled batch stays "open" with an empty pending list so
+                # the next append sees a full batch and opens a fresh one
+                self._pending = []
+
+            seller_1 = remaining_seller_1
+            seller_x = remaining_seller_x
+            seller_x_x = remaining_seller_x_x
+
     def get_sketches(self, batch_id, from_disk=False):
-        sketch_x_y_batch = None
+        if not from_disk and batch_id == self._pending_batch_id:
+            self._flush_pending()
+        if self._copy_stream is not None:
+            # Issue the H2D copies on the copy stream and make the compute
+            # stream wait on them, so transfers overlap preceding kernels
+            with torch.cuda.stream(self._copy_stream):
+                sketches = self._fetch_sketches(batch_id, from_disk)
+            torch.cuda.current_stream().wait_stream(self._copy_stream)
+            return sketches
+        return self._fetch_sketches(batch_id, from_disk)
+
+    def _fetch_sketches(self, batch_id, from_disk):
+        if self.is_buyer:
+            # Buyer sketches stay in the separate per-layer dicts (the 1 and
+            # x_y tensors have different widths) and are never spilled
+            sketch_x_y_batch = None
+            if batch_id in self.sketch_x_y_batch:
+                sketch_x_y_batch = self._to_device(self.sketch_x_y_batch[batch_id])
+            return (self._to_device(self.sketch_1_batch[batch_id]),
+                    self._to_device(self.sketch_x_batch[batch_id]),
+                    self._to_device(self.sketch_x_x_batch[batch_id]),
+                    sketch_x_y_batch)
         if from_disk:
-            # Buyer dataset never on disk
-            sketch_1_batch = torch.load(os.path.join(self.disk_dir, 
-                                                     "sketch_1_" + str(batch_id) + ".pt")).to(self.device)
-            sketch_x_batch = torch.load(os.path.join(self.disk_dir, 
-                                                     "sketch_x_" + str(batch_id) + ".pt")).to(self.device)
-            sketch_x_x_batch = torch.load(os.path.join(self.disk_dir, 
-                                                       "sketch_x_x_" + str(batch_id) + ".pt")).to(self.device)
+            # Keep the mmapped host tensor around so hot batches are served
+            # straight from the page cache
+            if batch_id not in self._disk_cache:
+                self._disk_cache[batch_id] = _load_tensor(
+                    os.path.join(self.disk_dir, "sketch_batch_" + str(batch_id) + ".npy"))
+            fused_batch = self._to_device(self._disk_cache[batch_id])
         else:
-            sketch_1_batch = self.sketch_1_batch[batch_id].to(self.device)
-            sketch_x_batch = self.sketch_x_batch[batch_id].to(self.device)
-            sketch_x_x_batch = self.sketch_x_x_batch[batch_id].to(self.device)
-            if batch_id in self.sketch_x_y_batch:
-                sketch_x_y_batch = self.sketch_x_y_batch[batch_id].to(self.device)
-        return sketch_1_batch, sketch_x_batch, sketch_x_x_batch, sketch_x_y_batch
+            fused_batch = self._to_device(self.sketch_batch[batch_id])
+        return fused_batch[0], fused_batch[1], fused_batch[2], None
 
     def get_num_batches(self):
         return self.num_batches
@@ -194,10 +450,26 @@ class SketchBase:
         self.device = device
         self.join_key_domain = join_key_domain
         self.current_df_id = 0
+        # Sketches are sums/means of aggregates, so half-precision storage with
+        # fp32 accumulation in the downstream matmuls is numerically fine; it
+        # halves the HBM footprint and doubles the effective batch size. CPU
+        # matmul has no fast bf16 path, so stay with fp32 there.
+        if device == 'cuda' and torch.cuda.is_available():
+            self.dtype = torch.bfloat16
+        else:
+            self.dtype = torch.float32
+        # Direct df_id -> (batch_id, offset) index maintained by the sketch
+        # loader as entries are added to feature_index_mapping
+        self._seller_index = {}
+        # Cartesian-product domain frames keyed by tuple(join_keys); the domain
+        # is fixed per key set, so the frame is identical for every calibration
+        self._domain_cache = {}
         if device == 'cuda' and torch.cuda.is_available():
             torch.cuda.init()
-            gpu_total_mem = torch.cuda.get_device_properties(0).total_memory
-            self.gpu_free_mem = gpu_total_mem - torch.cuda.memory_allocated(0)
+            # mem_get_info reports what the driver can actually hand out,
+            # unlike total_memory minus our own allocations which ignores
+            # other processes and allocator overhead
+            self.gpu_free_mem, _ = torch.cuda.mem_get_info(0)
         else:
             self.gpu_free_mem = None
         self.gpu_batch_size, self.ram_batch_size = self.estimate_batch_size()    
@@ -217,18 +489,24 @@ class SketchBase:
 
     """
     def estimate_batch_size(self):
-        # Similar logic as search_gpu.py, just copy and paste
-        bytes_per_element = 4
-        tensor_width = reduce(lambda x, y: x * len(y), 
+        tensor_width = reduce(lambda x, y: x * len(y),
                               self.join_key_domain.values(), 1)
+        # What one feature column actually costs: the fused sketch stores the
+        # 1/x/x_x layers (tensor_width elements each) in the storage dtype.
+        # Calibration additionally stages the per-group sums and squared sums
+        # as float64 on the host before the tensors are built, so the RAM
+        # estimate charges for that working set too.
+        sketch_bytes = 3 * tensor_width * self.dtype.itemsize
+        staging_bytes = 2 * tensor_width * np.dtype(np.float64).itemsize
+        # Leave a fixed headroom rather than the old blanket // 2 workaround,
+        # which undersized batches ~2x and multiplied the partition count
+        headroom = 0.8
         memory = psutil.virtual_memory()
-        # TODO: 2 is a workaround
-        available_memory = memory.available // 2
-        ram_batch_size = available_memory // (bytes_per_element * 3 * tensor_width)
+        ram_batch_size = int(memory.available * headroom) // (sketch_bytes + staging_bytes)
         if not self.gpu_free_mem or not torch.cuda.is_available():
             gpu_batch_size = ram_batch_size
         else:
-            gpu_batch_size = self.gpu_free_mem // (bytes_per_element * 3 * tensor_width)
+            gpu_batch_size = int(self.gpu_free_mem * headroom) // sketch_bytes
         return gpu_batch_size, ram_batch_size
 
     """
@@ -259,21 +537,122 @@ class SketchBase:
             seller_x_y = seller_x_y,
             feature_index_map = self.feature_index_mapping,
             seller_id = df_id,
-            to_disk = to_disk
+            to_disk = to_disk,
+            seller_index = self._seller_index
         )
-        # Return the updated offset corresponding to the df_id. This is not efficient. Only for unit test usage.
-        def find_by_seller_id(feature_index_map, seller_id):
-            for batch_id, entries in feature_index_map.items():
-                for end_pos, id, offset in entries:
-                    if id == seller_id:
-                        return batch_id, offset
-            return None, None  # If the seller_id is not found
-
-        batch_id, offset = find_by_seller_id(self.feature_index_mapping, df_id)
+        # Return the updated offset corresponding to the df_id. The loader keeps
+        # a direct df_id -> (batch_id, offset) index, so no scan is needed.
+        batch_id, offset = self._seller_index.get(df_id, (None, None))
         return {"batch_id": batch_id, "df_id": df_id, "offset": offset}
 
 
 
+    """
+    This function builds the dataframe holding the cartesian product of the join key
+    domains, with a __pos column recording the row order every calibrated tensor follows.
+
+    @param key_domains: a dictionary containing the domain of each join key.
+    @param join_keys: a list containing the names of the join keys.
+
+    @return: a dataframe with one row per join-key combination plus a __pos column
+    """
+    def _domain_frame(self, key_domains, join_keys):
+        cache_key = tuple(join_keys)
+        domain_df = self._domain_cache.get(cache_key)
+        if domain_df is None:
+            index_ranges = [list(key_domains[col]) for col in join_keys]
+            multi_index = pd.MultiIndex.from_product(index_ranges, names=join_keys)
+            domain_df = multi_index.to_frame(index=False)
+            domain_df["__pos"] = np.arange(len(domain_df))
+            self._domain_cache[cache_key] = domain_df
+        return domain_df
+
+    """
+    This function runs one duckdb aggregation of the given SQL expressions grouped by
+    the join keys, left-joined onto the cartesian product of the join key domains so
+    the result has exactly one row per domain combination in a stable order.
+
+    @param df: the dataframe to aggregate. This df should be with join keys.
+    @param join_keys: a list containing the names of the join keys.
+    @param key_domains: a dictionary containing the domain of each join key.
+    @param exprs: a list of SQL aggregate expressions over the df columns.
+
+    @return: a tuple (values, counts). values is a (num_rows, len(exprs)) float array
+             with missing groups filled with 0; counts is a (num_rows,) int array of
+             group sizes with missing groups filled with 1.
+    """
+    def _aggregate_over_domain(self, df, join_keys, key_domains, exprs):
+        domain_df = self._domain_frame(key_domains, join_keys)
+        key_list = ", ".join(_quote_ident(k) for k in join_keys)
+        agg_list = ", ".join(f'{expr} AS "agg_{i}"' for i, expr in enumerate(exprs))
+        coalesced = ", ".join(f'COALESCE(g."agg_{i}", 0) AS "agg_{i}"' for i in range(len(exprs)))
+
+        con = duckdb.connect()
+        try:
+            con.register("sketch_df", df)
+            con.register("domain_df", domain_df)
+            inner_cols = ", ".join(filter(None, [key_list, agg_list, 'COUNT(*) AS "cnt"']))
+            outer_cols = ", ".join(filter(None, [coalesced, 'COALESCE(g."cnt", 1) AS "cnt"']))
+            inner = f'SELECT {inner_cols} FROM sketch_df GROUP BY {key_list}'
+            query = (f'SELECT {outer_cols} '
+                     f'FROM domain_df d LEFT JOIN ({inner}) g USING ({key_list}) '
+                     f'ORDER BY d."__pos"')
+            result = con.execute(query).fetchnumpy()
+        finally:
+            con.close()
+
+        counts = np.asarray(result["cnt"], dtype=np.int64)
+        if exprs:
+            values = np.column_stack([np.asarray(result[f"agg_{i}"], dtype=np.float64)
+                                      for i in range(len(exprs))])
+        else:
+            values = np.zeros((len(counts), 0), dtype=np.float64)
+        return values, counts
+
+    """
+    This function is the compiled counterpart of _aggregate_over_domain, used when
+    numba is importable. Join keys are factorized against the domain lists (in the
+    same order as _domain_frame) into one linear group code per row, and a single
+    njit pass accumulates the feature sums, squared sums and cross-product sums.
+
+    @param df: the dataframe to aggregate. This df should be with join keys.
+    @param join_keys: a list containing the names of the join keys.
+    @param key_domains: a dictionary containing the domain of each join key.
+    @param ordered_columns: the feature columns of df, in order.
+    @param cross_pairs: the (col1, col2) pairs whose product sums are needed.
+
+    @return: the same (values, counts) pair as _aggregate_over_domain
+    """
+    def _aggregate_with_numba(self, df, join_keys, key_domains, ordered_columns, cross_pairs):
+        cache_key = ("lists",) + tuple(join_keys)
+        domains = self._domain_cache.get(cache_key)
+        if domains is None:
+            domains = [list(key_domains[col]) for col in join_keys]
+            self._domain_cache[cache_key] = domains
+
+        # Linear group code, row-major over the domains like MultiIndex.from_product;
+        # rows whose key is outside the domain get code -1 and are skipped
+        codes = np.zeros(len(df), dtype=np.int64)
+        valid = np.ones(len(df), dtype=bool)
+        for col, domain in zip(join_keys, domains):
+            col_codes = pd.Categorical(df[col], categories=domain).codes.astype(np.int64)
+            valid &= col_codes >= 0
+            codes = codes * len(domain) + col_codes
+        codes[~valid] = -1
+
+        features = df[ordered_columns].to_numpy(dtype=np.float64)
+        blocks = [features, features * features]
+        if cross_pairs:
+            iu_rows, iu_cols = np.triu_indices(len(ordered_columns), k=1)
+            blocks.append(features[:, iu_rows] * features[:, iu_cols])
+        value_matrix = np.ascontiguousarray(np.concatenate(blocks, axis=1))
+
+        num_groups = int(np.prod([len(domain) for domain in domains]))
+        values, counts = _group_sums_kernel(codes, value_matrix, num_groups)
+        # Missing groups count as 1, matching the SQL path's COALESCE
+        counts = np.maximum(counts, 1)
+        return values, counts
+
     """
     This function is used to get the 1, X, X_X, and X_Y matrices of a dataframe.
     takes in a df( with join key as a col)  and the key_domainsreturn and returns the calibrated 1, x, x_x tensors.
@@ -284,89 +663,79 @@ class SketchBase:
     @param join_keys: a list containing the names of the join keys.
     @param fit_by_residual: a boolean indicating whether to fit by residual.
     @param is_buyer: a boolean indicating whether the df is a buyer or seller.
+    @param feature_columns: the feature columns to calibrate. Defaults to every
+            non-join-key column of df; partitioned callers pass a sublist so the
+            full df can be shared across partitions without slicing copies.
 
     @return: a tuple containing the calibrated 1, x, x_x tensors
     """
 
-    def _calibrate(self, df_id, df, num_features, key_domains, join_keys, normalized=True, fit_by_residual=False, is_buyer=False):
-        # Get a squared df but not include join keys
-        non_join_key_columns = df.columns.difference(join_keys)
-        df_squared = df[non_join_key_columns] ** 2
-        df_squared[join_keys] = df[join_keys]
-
-        seller_sum = df.groupby(join_keys).sum()
-        ordered_columns = list(seller_sum.columns)
+    def _calibrate(self, df_id, df, num_features, key_domains, join_keys, normalized=True, fit_by_residual=False, is_buyer=False, feature_columns=None):
+        if feature_columns is None:
+            ordered_columns = [col for col in df.columns if col not in join_keys]
+        else:
+            ordered_columns = feature_columns
 
         if df_id not in self.dfid_feature_mapping:
             self.dfid_feature_mapping[df_id] = ordered_columns
         else:
             self.dfid_feature_mapping[df_id] += ordered_columns
-        
-        seller_sum_squares = df_squared.groupby(join_keys).sum()[ordered_columns]
-        seller_count = df.groupby(join_keys).size().to_frame('count')
 
-        
+        # The pairwise cross products enumerate in combinations(...) order, so
+        # downstream x_y indexing is unchanged
+        cross_pairs = []
         if not fit_by_residual and is_buyer:
-            df_cross, ordered_cross_cols = {}, []
-            for col1, col2 in combinations(ordered_columns, 2):
-                df_cross[f"{col1}_{col2}"] = df[col1] * df[col2]
-                ordered_cross_cols.append(f"{col1}_{col2}")
-            df_cross = pd.DataFrame(df_cross)
-            df_cross[join_keys] = df[join_keys]
-            seller_sum_cross = df_cross.groupby(join_keys).sum()[ordered_cross_cols]
-            if normalized:
-                seller_sum_cross = seller_sum_cross.div(seller_count['count'], axis=0)
-        
-                
-        # Normalize by seller_count if normalization is enabled
-        if normalized:
-            seller_sum = seller_sum.div(seller_count['count'], axis=0)
-            seller_sum_squares = seller_sum_squares.div(seller_count['count'], axis=0)
+            cross_pairs = list(combinations(ordered_columns, 2))
 
+        if numba is not None:
+            # Compiled bincount-style accumulator over factorized join keys
+            values, counts = self._aggregate_with_numba(
+                df, join_keys, key_domains, ordered_columns, cross_pairs)
+        else:
+            # One columnar SQL pass computes every per-group aggregate (sums,
+            # sums of squares, cross-product sums and group sizes) left-joined
+            # onto the cartesian product of the join-key domains, replacing four
+            # pandas groupby calls plus reindex/isin passes per tensor
+            exprs = [f'SUM({_quote_ident(c)})' for c in ordered_columns]
+            exprs += [f'SUM({_quote_ident(c)} * {_quote_ident(c)})' for c in ordered_columns]
+            exprs += [f'SUM({_quote_ident(c1)} * {_quote_ident(c2)})' for c1, c2 in cross_pairs]
+            values, counts = self._aggregate_over_domain(df, join_keys, key_domains, exprs)
+
+        num_cols = len(ordered_columns)
+        seller_x = values[:, :num_cols]
+        seller_x_x = values[:, num_cols:2 * num_cols]
+        seller_x_y = values[:, 2 * num_cols:]
+
+        # Normalize by the group sizes if normalization is enabled
+        if normalized:
+            seller_x = seller_x / counts[:, None]
+            seller_x_x = seller_x_x / counts[:, None]
+            if cross_pairs:
+                seller_x_y = seller_x_y / counts[:, None]
             # Set seller_count to 1 for each group
-            seller_count = seller_count.assign(count=1)
-
-        if not isinstance(seller_sum.index, pd.MultiIndex):
-            seller_sum.index = pd.MultiIndex.from_arrays(
-                [seller_sum.index], names=join_keys)
-            seller_sum_squares.index = pd.MultiIndex.from_arrays(
-                [seller_sum_squares.index], names=join_keys)
-            seller_count.index = pd.MultiIndex.from_arrays(
-                [seller_count.index], names=join_keys)
-            
-            if not fit_by_residual and is_buyer:
-                seller_sum_cross.index = pd.MultiIndex.from_arrays(
-                    [seller_sum_cross.index], names=join_keys)
-            
-        # Create the correct multi_index for cartesian product
-        index_ranges = [key_domains[col] for col in join_keys]
-        multi_index = pd.MultiIndex.from_product(index_ranges, names=join_keys)
-        
-        # Temporary DataFrame to facilitate 'inner' join
-        temp_df = pd.DataFrame(index=multi_index)
-
-        # Reindex and perform inner join
-        seller_x = seller_sum.reindex(multi_index, fill_value=0)
-        seller_x = seller_x[seller_x.index.isin(temp_df.index)].values
-
-        seller_x_x = seller_sum_squares.reindex(multi_index, fill_value=0)
-        seller_x_x = seller_x_x[seller_x_x.index.isin(temp_df.index)].values
+            seller_count = np.ones_like(counts)
+        else:
+            seller_count = counts
 
-        seller_count = seller_count.reindex(multi_index, fill_value=1)
-        seller_count = seller_count[seller_count.index.isin(temp_df.index)].values
-        
         seller_x_y_tensor = None
-        
+
         if not fit_by_residual and is_buyer:
-            seller_x_y = seller_sum_cross.reindex(multi_index, fill_value=0)
-            seller_x_y = seller_x_y[seller_x_y.index.isin(temp_df.index)].values
-            seller_x_y_tensor = torch.tensor(seller_x_y, dtype=torch.float32)
-        
+            seller_x_y_tensor = torch.tensor(seller_x_y, dtype=self.dtype)
+
         # Convert to PyTorch tensors
-        seller_x_tensor = torch.tensor(seller_x, dtype=torch.float32)
-        seller_x_x_tensor = torch.tensor(seller_x_x, dtype=torch.float32)
+        seller_x_tensor = torch.tensor(seller_x, dtype=self.dtype)
+        seller_x_x_tensor = torch.tensor(seller_x_x, dtype=self.dtype)
         seller_count_tensor = torch.tensor(
             seller_count, dtype=torch.int).view(-1, 1)
+
+        # Pin host memory so the sketch loader can do async (non_blocking) H2D
+        # copies instead of synchronous pageable transfers
+        if self.device == 'cuda' and torch.cuda.is_available():
+            seller_x_tensor = seller_x_tensor.pin_memory()
+            seller_x_x_tensor = seller_x_x_tensor.pin_memory()
+            seller_count_tensor = seller_count_tensor.pin_memory()
+            if seller_x_y_tensor is not None:
+                seller_x_y_tensor = seller_x_y_tensor.pin_memory()
         seller_1_tensor = seller_count_tensor.expand(-1, num_features)
 
         return seller_x_tensor, seller_x_x_tensor, seller_1_tensor, seller_x_y_tensor
@@ -379,24 +748,37 @@ class SketchBase:
     @return: a tuple containing the df_id and a feature name indicated by the dfid_feature_mapping
     """
     def get_df_by_feature_index(self, batch_id, feature_index):
-        # Perform a binary search to find the right interval
-        # bisect.bisect returns the insertion point which gives us the index where the feature_index would be inserted to maintain order.
-        # We subtract one to get the tuple corresponding to the start index of the range that the feature_index falls into.
-        def bisect(a, x):
-            lo, hi = 0, len(a)
-            while lo < hi:
-                mid = (lo + hi) // 2
-                if x < a[mid][0]:  # Compare with the first element of the tuple at mid
-                    hi = mid
-                else:
-                    lo = mid + 1
-            return lo
-        index = bisect(self.feature_index_mapping[batch_id], feature_index) - 1
-        start_index, df_id, offset = self.feature_index_mapping[batch_id][index]
+        # Binary search over the contiguous 'ends' key array; side='right' gives
+        # the insertion point, minus one lands on the range the index falls into
+        entry = self.feature_index_mapping[batch_id]
+        index = int(np.searchsorted(entry["ends"], feature_index, side='right')) - 1
+        start_index = int(entry["ends"][index])
+        df_id = int(entry["ids"][index])
+        offset = int(entry["offsets"][index])
         # Calculate the local feature index within the seller's dataset
         local_feature_index = feature_index - start_index + offset
         return df_id, self.dfid_feature_mapping[df_id][local_feature_index]
-    
+
+    """
+    Batched counterpart of get_df_by_feature_index: one searchsorted resolves
+    every queried feature index of a batch at once instead of paying the Python
+    call overhead per feature.
+    @param batch_id: the batch_id the feature indices belong to
+    @param feature_indices: an array-like of feature indices within the batch
+
+    @return: a tuple (df_ids, feature_names) where df_ids is an int64 array and
+             feature_names the corresponding list of feature names
+    """
+    def get_dfs_by_feature_indices(self, batch_id, feature_indices):
+        entry = self.feature_index_mapping[batch_id]
+        feature_indices = np.asarray(feature_indices, dtype=np.int64)
+        positions = np.searchsorted(entry["ends"], feature_indices, side='right') - 1
+        df_ids = entry["ids"][positions]
+        local_indices = feature_indices - entry["ends"][positions] + entry["offsets"][positions]
+        feature_names = [self.dfid_feature_mapping[int(df_id)][int(local_index)]
+                         for df_id, local_index in zip(df_ids, local_indices)]
+        return df_ids, feature_names
+
     def get_sketch_loader(self):
         return self.sketch_loader
     
@@ -433,26 +815,40 @@ class SellerSketch():
     def register_this_seller(self):
         # First we should cut the df into partitions to maximize the GPU and RAM usage
         ram_batch_size = self.sketch_base.ram_batch_size
-        # Rename the columns and add the join keys as prefix to the column names
-        prefix = "_".join(self.join_keys) + "_"
-        self.seller_df.columns = [prefix + col if col not in self.join_keys else col for col in self.seller_df.columns]
+        # Columns arrive fully prefixed ("{join_key}_{seller_name}_{col}")
+        # from DataMarket.register_seller, so no rename pass is needed here
         feature_columns = [col for col in self.seller_df.columns if col not in self.join_keys]
         if len(self.seller_df.columns) > ram_batch_size:
             features_per_partition = ram_batch_size - 1
             # Splitting the DataFrame into partitions
             num_partitions = (len(feature_columns) // features_per_partition) + (len(feature_columns) % features_per_partition > 0)
-            for i in range(num_partitions):
-                cur_features = feature_columns[i * features_per_partition:(i + 1) * features_per_partition] # Avoid address coding
-                cols = self.join_keys + cur_features
-                # Creating a new DataFrame for this partition
-                cur_df = self.seller_df[cols]
-                # Calibrate the df
-                seller_x, seller_x_x, seller_1, seller_x_y = self.sketch_base._calibrate(
-                    self.df_id, cur_df, len(cur_features), self.join_key_domains, self.join_keys)
-                # Register the df
-                result = self.sketch_base._register_df(self.df_id, len(cur_features), seller_1, seller_x, seller_x_x)
-                self.batch_id = result["batch_id"]
-                self.offset = result["offset"]
+
+            def calibrate_partition(cur_features):
+                # Calibrate this partition directly on the shared df; passing
+                # the column sublist avoids a full data copy per partition
+                return self.sketch_base._calibrate(
+                    self.df_id, self.seller_df, len(cur_features), self.join_key_domains, self.join_keys,
+                    feature_columns=cur_features)
+
+            # Pipeline the partitions: while the main thread registers (H2D
+            # copies) partition i, a worker thread calibrates partition i+1 on
+            # the CPU. One future in flight keeps at most two partitions'
+            # tensors alive, and the single worker preserves the calibration
+            # order that dfid_feature_mapping appends rely on.
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                pending = executor.submit(
+                    calibrate_partition, feature_columns[:features_per_partition])
+                for i in range(num_partitions):
+                    cur_features = feature_columns[i * features_per_partition:(i + 1) * features_per_partition] # Avoid address coding
+                    seller_x, seller_x_x, seller_1, seller_x_y = pending.result()
+                    if i + 1 < num_partitions:
+                        pending = executor.submit(
+                            calibrate_partition,
+                            feature_columns[(i + 1) * features_per_partition:(i + 2) * features_per_partition])
+                    # Register the df
+                    result = self.sketch_base._register_df(self.df_id, len(cur_features), seller_1, seller_x, seller_x_x)
+                    self.batch_id = result["batch_id"]
+                    self.offset = result["offset"]
         else:
             # Directly calibrate the df
             seller_x, seller_x_x, seller_1, seller_x_y = self.sketch_base._calibrate(
@@ -491,6 +887,10 @@ class BuyerSketch():
 
         # This is to indicate the target feature of the buyer
         self.target_feature = target_feature
+        # Position of the target among the calibrated feature columns,
+        # resolved lazily (the mapping is filled during registration) and
+        # memoized; add_feature only appends so the index never moves
+        self._y_ind = None
         if not fit_by_residual:
             # When fitting by residual, the target feature is not in the buyer_df
             self.target_feature_index = buyer_df.columns.get_loc(target_feature)
@@ -524,7 +924,68 @@ class BuyerSketch():
         # We don't update df_id here because it is the id of the buyer_df
 
         return self.batch_id, self.offset
-    
+
+    """
+    This function appends one feature to an already registered buyer sketch by
+    updating the sufficient statistics in place: only the new column's mean,
+    squared mean and cross products with the existing features are aggregated,
+    instead of re-registering the whole buyer. Only valid for the
+    not-fit-by-residual layout (the residual path replaces the target wholesale).
+
+    @param buyer_df: the updated buyer dataframe containing the new feature
+    @param feature_name: the name of the appended feature
+    """
+    def add_feature(self, buyer_df, feature_name):
+        base = self.sketch_base
+        loader = base.sketch_loader
+        existing = base.dfid_feature_mapping[self.df_id]
+        d = len(existing)
+
+        # Aggregate [new, new^2, c_i * new] per join-key group with the same
+        # machinery _calibrate uses, then normalize to means
+        new_vals = buyer_df[feature_name].to_numpy(dtype=np.float64)
+        cross = {feature_name: new_vals, "__sq": new_vals * new_vals}
+        cross_cols = [feature_name, "__sq"]
+        for col in existing:
+            cross["__x_" + col] = buyer_df[col].to_numpy(dtype=np.float64) * new_vals
+            cross_cols.append("__x_" + col)
+        cross_df = pd.DataFrame(cross)
+        for key in self.join_keys:
+            cross_df[key] = buyer_df[key].to_numpy()
+
+        if numba is not None:
+            values, counts = base._aggregate_with_numba(
+                cross_df, self.join_keys, self.join_key_domains, cross_cols, [])
+        else:
+            exprs = [f'SUM({_quote_ident(c)})' for c in cross_cols]
+            values, counts = base._aggregate_over_domain(
+                cross_df, self.join_keys, self.join_key_domains, exprs)
+        sums = values[:, :len(cross_cols)] / counts[:, None]
+
+        def to_device(array_2d):
+            return torch.tensor(array_2d, dtype=base.dtype).to(loader.device)
+
+        new_y = to_device(sums[:, 0:1])
+        new_y_y = to_device(sums[:, 1:2])
+        new_pairs = to_device(sums[:, 2:])
+
+        loader.sketch_x_batch[0] = torch.cat((loader.sketch_x_batch[0], new_y), dim=1)
+        loader.sketch_x_x_batch[0] = torch.cat((loader.sketch_x_x_batch[0], new_y_y), dim=1)
+
+        # Cross products stay in combinations(range(d+1), 2) order, where the
+        # new feature has index d: each old (i, j) block keeps its order and
+        # the (i, d) column slots in at the end of feature i's block
+        old_x_y = loader.sketch_x_y_batch[0]
+        old_index = {pair: k for k, pair in enumerate(combinations(range(d), 2))}
+        combined = torch.cat((old_x_y, new_pairs), dim=1)
+        order = []
+        for i, j in combinations(range(d + 1), 2):
+            order.append(old_index[(i, j)] if j < d else old_x_y.shape[1] + i)
+        loader.sketch_x_y_batch[0] = combined[:, order]
+
+        base.dfid_feature_mapping[self.df_id] = existing + [feature_name]
+        self.buyer_df = buyer_df
+
     def get_base(self):
         return self.sketch_base
     
@@ -536,6 +997,18 @@ class BuyerSketch():
     def get_sketches(self):
         return self.sketch_base.sketch_loader.get_sketches(self.batch_id)
     
+    """
+    This function returns the index of the target feature among this sketch's
+    calibrated feature columns.
+
+    @return: the integer index of the target feature
+    """
+    def y_ind(self):
+        if self._y_ind is None:
+            ordered_columns = self.sketch_base.dfid_feature_mapping[self.df_id]
+            self._y_ind = ordered_columns.index(self.target_feature)
+        return self._y_ind
+
     """
     This function gets the feature index and name of the target feature in the buyer df.
 
@@ -566,12 +1039,19 @@ class DataMarket():
         self.buyer_target_feature = ""
         self.buyer_join_keys = []
 
-        # Storing the id-name pair for each seller and buyer
-        self.seller_id_to_df_and_name = []
-        self.buyer_id_to_df_and_name = []
+        # Names and dataframes per seller/buyer id, kept as parallel lists so
+        # id lookups are plain list indexing instead of dict hashing
+        self._seller_names = []
+        self._seller_dfs = []
+        self._buyer_names = []
+        self._buyer_dfs = []
 
         self.augplan_acc = []
 
+        # Bumped on every seller registration so consumers caching seller
+        # sketches know when to invalidate
+        self.seller_version = 0
+
         # Device
         self.device = device
 
@@ -589,10 +1069,12 @@ class DataMarket():
     @return: seller_id
     """
     def register_seller(self, seller_df: pd.DataFrame, seller_name: str, join_keys: list, join_key_domains: dict):
-        # To avoid the case where the seller_df are containing some features that have the same name as the registered features, 
-        # we need to add a prefix for all the features except the join keys
-        prefix = seller_name + "_"
-        seller_df.columns = [prefix + col if col not in join_keys else col for col in seller_df.columns]
+        # To avoid the case where the seller_df are containing some features that have the same name as the registered features,
+        # the features are prefixed with the seller name and the join key. Both
+        # prefixes are folded into one rename below so the frame's Index is
+        # rebuilt once per join key instead of twice per seller.
+        # (sorted matches the old columns.difference ordering)
+        feature_columns = sorted(col for col in seller_df.columns if col not in join_keys)
         for join_key in join_keys:
             if join_key in self.seller_sketches:
                 seller_sketch_base = self.seller_sketches[join_key]["sketch_base"]
@@ -601,7 +1083,9 @@ class DataMarket():
                 # Create a new list for the new join key
                 self.seller_sketches[join_key] = {}
                 self.seller_sketches[join_key]["sketch_base"] = seller_sketch_base
-            seller_df_with_the_key = seller_df[list(seller_df.columns.difference(join_keys)) + [join_key]]
+            seller_df_with_the_key = seller_df[feature_columns + [join_key]]
+            seller_df_with_the_key.columns = (
+                [f"{join_key}_{seller_name}_{col}" for col in feature_columns] + [join_key])
             # Create a SellerSketch object
             seller_sketch = SellerSketch(
                 seller_df_with_the_key, 
@@ -623,12 +1107,11 @@ class DataMarket():
             
             batch_id, offset = seller_sketch.register_this_seller()
 
-        self.seller_id_to_df_and_name.append(
-            {"name": seller_name,
-             "dataframe": seller_df}
-        )
+        self._seller_names.append(seller_name)
+        self._seller_dfs.append(seller_df)
         # Update the seller_id
         self.seller_id += 1
+        self.seller_version += 1
 
         return self.seller_id - 1
 
@@ -648,8 +1131,8 @@ class DataMarket():
     """
     def register_buyer(self, buyer_df: pd.DataFrame, join_keys: list, join_key_domains: dict, target_feature: str, fit_by_residual=False):     
         if fit_by_residual:
-            self.buyer_dataset_for_residual = copy.deepcopy(buyer_df)
-        self.buyer_dataset = copy.deepcopy(buyer_df)
+            self.buyer_dataset_for_residual = buyer_df.copy(deep=False)
+        self.buyer_dataset = buyer_df.copy(deep=False)
         self.buyer_join_keys = join_keys
         self.buyer_target_feature = target_feature
         X = list(self.buyer_dataset.columns.difference([target_feature] + join_keys))
@@ -661,12 +1144,15 @@ class DataMarket():
         else:
             self.buyer_dataset = self.buyer_dataset.drop(columns=["residuals"], errors="ignore")
 
+        # Computed once instead of one Index.difference per join key
+        # (sorted matches the old columns.difference ordering)
+        non_join_columns = sorted(col for col in self.buyer_dataset.columns if col not in join_keys)
         for join_key in join_keys:
             if join_key in self.buyer_sketches:
                 buyer_sketch_base = self.buyer_sketches[join_key]["buyer_sketch"].get_base()
             else:
                 buyer_sketch_base = SketchBase(join_key_domain=join_key_domains, device=self.device, is_buyer=True)
-            buyer_df_with_the_key = self.buyer_dataset[list(self.buyer_dataset.columns.difference(join_keys)) + [join_key]]
+            buyer_df_with_the_key = self.buyer_dataset.loc[:, non_join_columns + [join_key]]
             # Create a BuyerSketch object
             buyer_sketch = BuyerSketch(
                 buyer_df_with_the_key, 
@@ -687,10 +1173,8 @@ class DataMarket():
 
             batch_id, offset = buyer_sketch.register_this_buyer(fit_by_residual=fit_by_residual) # Currently, batch_id and offset are not used
 
-        self.buyer_id_to_df_and_name.append(
-            {"name": target_feature,
-             "dataframe": self.buyer_dataset}
-        )
+        self._buyer_names.append(target_feature)
+        self._buyer_dfs.append(self.buyer_dataset)
         # Update the buyer_id
         self.buyer_id += 1
 
@@ -748,10 +1232,35 @@ class DataMarket():
         self.buyer_sketches = {}
 
     """
-    This function resets the buyer_id_to_df_and_name
+    This function gets the name of a seller based on the seller_id.
+    """
+    def seller_name(self, seller_id):
+        return self._seller_names[seller_id]
+
+    """
+    This function gets the dataframe of a seller based on the seller_id.
+    """
+    def seller_df(self, seller_id):
+        return self._seller_dfs[seller_id]
+
+    """
+    This function gets the dataframe of a buyer based on the buyer_id.
+    """
+    def buyer_df(self, buyer_id):
+        return self._buyer_dfs[buyer_id]
+
+    """
+    This function replaces the dataframe stored for a buyer_id.
+    """
+    def set_buyer_df(self, buyer_id, df):
+        self._buyer_dfs[buyer_id] = df
+
+    """
+    This function resets the per-id buyer name/dataframe lists
     """
     def reset_buyer_id_to_df_and_name(self):
-        self.buyer_id_to_df_and_name = []
+        self._buyer_names = []
+        self._buyer_dfs = []
     
 
 class SearchEngine():
@@ -759,7 +1268,7 @@ class SearchEngine():
     def __init__(self, data_market: DataMarket, fit_by_residual=False):
         self.augplan = []
         self.augplan_acc = []
-        self.aug_seller_feature_ind = {}
+        self.aug_seller_feature_ind = {} # {join_key: {batch_id: [feature_index]}}
         self.buyer_target = data_market.buyer_target_feature
         self.buyer_features = data_market.buyer_dataset.columns
         self.buyer_dataset = None  # placeholder for buyer dataset
@@ -772,18 +1281,147 @@ class SearchEngine():
 
         self.unusable_features = {} # {batch_id: [feature_index]}
 
+        # Cached scatter index tensors for the XTX/XTY assembly, keyed by
+        # (d, y_ind); they only depend on the buyer feature layout
+        self._scatter_cache = {}
+
+        # Device-resident seller sketches keyed by (join_key, batch_id).
+        # Sellers only change on registration, so the same batches are reused
+        # across iterations instead of being re-fetched each time; the data
+        # market's seller_version says when to invalidate.
+        self._seller_cache = {}
+        self._seller_cache_version = None
+
+        # Reusable XTX/XTY scratch, keyed by name; fresh allocations per
+        # (join_key, batch_id) would churn the caching allocator every batch
+        self._moment_buffers = {}
+
+        # Persistent per-(join_key, batch_id) exclusion masks: features that
+        # were already selected or turned out singular are masked with one
+        # fused masked_fill instead of per-index Python writes
+        self._excluded_masks = {}
+
+        # Side streams for scoring independent (join_key, batch_id) pairs in
+        # parallel; empty on CPU where stream semantics don't apply
+        if data_market.device == 'cuda' and torch.cuda.is_available():
+            self._streams = [torch.cuda.Stream() for _ in range(4)]
+        else:
+            self._streams = []
+
+    """
+    This function returns the persistent exclusion mask for a (join_key,
+    batch_id) pair, growing it (and preserving set bits) if the batch now has
+    more features than when the mask was created.
+
+    @param join_key: the join key the batch belongs to
+    @param batch_id: the batch the mask covers
+    @param num_features: the number of features the caller needs covered
+
+    @return: a BoolTensor of at least num_features entries on the market device
+    """
+    def _exclusion_mask(self, join_key, batch_id, num_features):
+        mask = self._excluded_masks.get((join_key, batch_id))
+        if mask is None or mask.shape[0] < num_features:
+            grown = torch.zeros(num_features, dtype=torch.bool, device=self.data_market.device)
+            if mask is not None:
+                grown[:mask.shape[0]] = mask
+            mask = grown
+            self._excluded_masks[(join_key, batch_id)] = mask
+        return mask
+
+    """
+    This function returns a zeroed scratch tensor of the requested shape,
+    reusing (a slice of) the previously allocated buffer whenever the trailing
+    dimensions still match and enough rows are available.
+
+    @param name: which scratch buffer to fetch (e.g. "XTX")
+    @param shape: the (rows, ...) shape the caller needs
+
+    @return: a zero-filled tensor view of the requested shape on the market device
+    """
+    def _moment_buffer(self, name, shape):
+        buf = self._moment_buffers.get(name)
+        if buf is None or buf.shape[0] < shape[0] or buf.shape[1:] != shape[1:]:
+            buf = torch.empty(shape[0], *shape[1:], device=self.data_market.device)
+            self._moment_buffers[name] = buf
+        return buf[:shape[0]].zero_()
+
+    """
+    This function builds (and caches) the index tensors that map the moment
+    rows produced by the assembly GEMMs in search_one_iteration onto their
+    XTX/XTY slots. The layout only depends on the number of buyer features and
+    the position of the target among them, so it is computed once per buyer.
+
+    @param d: the number of buyer features (target included)
+    @param y_ind: the index of the target feature among the buyer features
+
+    @return: a dictionary of LongTensors on the market device
+    """
+    def _moment_scatter(self, d, y_ind):
+        cached = self._scatter_cache.get((d, y_ind))
+        if cached is not None:
+            return cached
+        device = self.data_market.device
+
+        def as_index(values):
+            return torch.tensor(values, dtype=torch.long, device=device)
+
+        # Column of buyer feature i inside X = [1, seller, buyer features]:
+        # the target is skipped, features before it shift by the two leading
+        # intercept/seller columns, features after it by one
+        pos = [i + 2 if i < y_ind else i + 1 for i in range(d)]
+        others = [i for i in range(d) if i != y_ind]
+        # Pairwise products are laid out in combinations(range(d), 2) order;
+        # pairs containing the target feed XTY, the rest fill XTX off-diagonals
+        xty_pair_pos, xty_pair_rows = [], []
+        xtx_pair_pos, xtx_pair_i, xtx_pair_j = [], [], []
+        for p, (i, j) in enumerate(combinations(range(d), 2)):
+            if i == y_ind:
+                xty_pair_pos.append(p)
+                xty_pair_rows.append(pos[j])
+            elif j == y_ind:
+                xty_pair_pos.append(p)
+                xty_pair_rows.append(pos[i])
+            else:
+                xtx_pair_pos.append(p)
+                xtx_pair_i.append(pos[i])
+                xtx_pair_j.append(pos[j])
+        cached = {
+            "others": as_index(others),
+            "pos_others": as_index([pos[i] for i in others]),
+            "xty_pair_pos": as_index(xty_pair_pos),
+            "xty_pair_rows": as_index(xty_pair_rows),
+            "xtx_pair_pos": as_index(xtx_pair_pos),
+            "xtx_pair_i": as_index(xtx_pair_i),
+            "xtx_pair_j": as_index(xtx_pair_j),
+        }
+        self._scatter_cache[(d, y_ind)] = cached
+        return cached
+
     """
     This function is used to search for the best seller for a buyer. It will iterate through all the join keys and
     find the best seller for each join key. It will return the best seller for each join key.
 
     @return: a dictionary containing the best seller for each join key
     """
+    @torch.inference_mode()
     def search_one_iteration(self):
-        
-        best_r_squared = 0
-        best_r_squared_ind = -1
-        best_batch_id = -1
-        best_join_key = None
+
+        # Per-batch winners land in preallocated device-side slots, so batches
+        # running on different streams never contend and no batch pays a host
+        # sync; batch_meta maps a slot back to its (join_key, batch_id)
+        device = self.data_market.device
+        total_batches = sum(
+            self.data_market.get_seller_sketch_base_by_keys(jk).get_sketch_loader().get_num_batches()
+            for jk in self.data_market.buyer_sketches)
+        batch_vals = torch.full((max(total_batches, 1),), float('-inf'), device=device)
+        batch_inds = torch.zeros(max(total_batches, 1), dtype=torch.long, device=device)
+        batch_meta = []
+
+        # Drop cached seller sketches if any seller was (re)registered
+        if self._seller_cache_version != self.data_market.seller_version:
+            self._seller_cache.clear()
+            self._seller_cache_version = self.data_market.seller_version
 
         # Get buyer_sketches from data_market
         self.buyer_sketches = self.data_market.buyer_sketches # join_key: {id, join_key, join_key_domain, buyer_sketch}
@@ -795,168 +1433,209 @@ class SearchEngine():
             # Get the buyer sketches
             buyer_1, buyer_y, buyer_y_y, buyer_x_y = buyer_sketch.get_sketches()
 
+            if not self.fit_by_residual:
+                d = buyer_y.shape[1]
+                y_ind = buyer_sketch.y_ind()
+                scatter = self._moment_scatter(d, y_ind)
+                # One (N, 1+2d+P) operand shared by every batch: the counts,
+                # the buyer features, their squares and their pairwise
+                # products. fp32 so the GEMMs accumulate in full precision.
+                buyer_mat = torch.cat(
+                    [buyer_1.to(torch.float32), buyer_y.to(torch.float32),
+                     buyer_y_y.to(torch.float32), buyer_x_y.to(torch.float32)], dim=1)
+
             # Get the search_sketch for the buyer (which is just the seller sketch with join_key)
             search_sketch_base = self.data_market.get_seller_sketch_base_by_keys(join_key)
             # print feature names of this sketch
 
             for batch_id in range(search_sketch_base.get_sketch_loader().get_num_batches()):
-                seller_1, seller_x, seller_x_x, _ =search_sketch_base.get_sketch_loader().get_sketches(batch_id)
-                if not self.fit_by_residual:
-                    d = buyer_y.shape[1]
-                    ordered_columns = buyer_sketch.get_base().dfid_feature_mapping[buyer_id]
-                    y_ind = ordered_columns.index(buyer_sketch.get_target_feature()["name"])
-                    
-                    # Algortihm
-                    XTX = torch.zeros(seller_x.shape[1], d+1, d+1).to(self.data_market.device)
-                    XTY = torch.zeros(seller_x.shape[1], d+1, 1).to(self.data_market.device)
-                    c = torch.sum(buyer_1 * seller_1, dim=0)
-                    x = torch.sum(seller_x * buyer_1, dim=0)
-                    x_x = torch.sum(seller_x_x * buyer_1, dim=0)
-                    x_x[x_x == 0] = 1
-                    y = torch.sum(buyer_y[:, y_ind:y_ind+1] * seller_1, dim=0) 
-                    y_y = torch.sum(buyer_y_y[:, y_ind:y_ind+1] * seller_1, dim=0)
-                    TSS = y_y - y * y / c
-                    XTX[:, 0, 0] = c
-                    XTX[:, 0, 1] = XTX[:, 1, 0] = x
-                    XTX[:, 1, 1] = x_x
-                    for i in range(d):
-                        cur_buyer_y = buyer_y[:, i:i+1]
-                        cur_buyer_y_y = buyer_y_y[:, i:i+1]
-
-                        cur_x_y = torch.sum(seller_x * cur_buyer_y, dim=0)
-                        cur_y_y = torch.sum(cur_buyer_y_y * seller_1, dim=0)
-                        cur_y = torch.sum(cur_buyer_y * seller_1, dim=0)
-                        cur_y_y[cur_y_y == 0] = 1
-
-                        if i == y_ind:
-                            XTY[:, 0, 0] = cur_y
-                            XTY[:, 1, 0] = cur_x_y
-                        elif i < y_ind:
-                            XTX[:, i+2, i+2] = cur_y_y
-                            XTX[:, 1, i+2] = XTX[:, i+2, 1] = cur_x_y
-                            XTX[:, 0, i+2] = XTX[:, i+2, 0] = cur_y
-                        else:
-                            XTX[:, i+1, i+1] = cur_y_y
-                            XTX[:, 1, i+1] = XTX[:, i+1, 1] = cur_x_y
-                            XTX[:, 0, i+1] = XTX[:, i+1, 0] = cur_y
-                        
-                        # (2d-i)(i-1)/2 +j-i's column
-                        for j in range(i+1, d):
-                            x_y_ind = int((2*d-i-1)*i/2+j-i)-1
-                            x_y_ = torch.sum(buyer_x_y[:, x_y_ind:x_y_ind+1] * seller_1, dim=0)
-                            if i == y_ind:
-                                XTY[:, j+1, 0] = x_y_
-                            elif j == y_ind:
-                                XTY[:, i+2, 0] = x_y_
-                            elif i > y_ind:
-                                XTX[:, i+1, j+1] = XTX[:, j+1, i+1] = x_y_
-                            elif i < y_ind and j > y_ind:
-                                XTX[:, i+2, j+1] = XTX[:, j+1, i+2] = x_y_
-                            else:
-                                XTX[:, i+2, j+2] = XTX[:, j+2, i+2] = x_y_
-
-                    inverses = torch.empty_like(XTX)
-
-                    for i in range(len(XTX)):
-                        try:
-                            # Try to calculate the inverse of the matrix
-                            inverses[i] = torch.linalg.inv(XTX[i])
-                        except RuntimeError as e:
-                            # If the matrix is singular, store the feature index and batch id
-                            print(f"[Warning] Singular matrix at batch {batch_id} and feature index {i}, corresponding to feature { self.data_market.get_seller_sketch_base_by_keys(join_key).get_df_by_feature_index(batch_id, i)[1]}")
-                            self.unusable_features[batch_id] = self.unusable_features.get(batch_id, [])
-                            self.unusable_features[batch_id].append(i)
-                            # Set this layer to a zero matrix
-                            inverses[i] = torch.zeros_like(XTX[i])
-
-                    res = torch.bmm(inverses, XTY).to(self.data_market.device)
-                    RSS = y_y
-                    for i in range(d+1):
-                        for j in range(d+1):
-                            RSS += res[:, i, 0]*res[:, j, 0]*XTX[:, i, j]
-                            
-                        RSS -= 2*res[:, i, 0]*XTY[:, i, 0]
-                    r_squared = 1 - RSS / TSS
-                else:
-                    # TODO: might be singular, how to deal with it
-                    x_x = torch.sum(seller_x_x * buyer_1, dim=0)
-                    x = torch.sum(seller_x * buyer_1, dim=0)
-                    c = torch.sum(buyer_1 * seller_1, dim=0)
-
-                    x_y = torch.sum(seller_x * buyer_y, dim=0)
-                    y_y = torch.sum(buyer_y_y * seller_1, dim=0)
-                    y = torch.sum(buyer_y * seller_1, dim=0)
-
-                    # Calculate means
-                    x_mean = x / c
-                    y_mean = y / c
-
-                    # Calculate the components needed for the formulas
-                    # Sum of squares of deviations is often denoted as S_xx (for x) and S_yy (for y)
-                    # and sum of cross-deviations as S_xy
-                    S_xx = x_x - 2 * x_mean * x + c * x_mean ** 2
-                    S_xy = x_y - x_mean * y - x * y_mean + c * x_mean * y_mean
-
-                    # Calculate regression coefficients, i.e., slope and intercept for each set
-                    # Formula for the slope (beta or m): S_xy / S_xx
-                    # Formula for the intercept (alpha or c): y_mean - m * x_mean
-                    slope = S_xy / S_xx
-                    intercept = y_mean - slope * x_mean
-
-                    TSS = y_y - 2 * y_mean * y + c * y_mean ** 2
-                    RSS = y_y + c * intercept ** 2 + slope ** 2 * x_x - 2 * \
-                        (slope * x_y + intercept * y - slope * intercept * x)
-
-                    # Calculate R² value for each regression model
-                    # R² = 1 - (RSS / TSS)
-                    r_squared = 1 - (RSS / TSS)
-                # Replace NaN values with negative infinity
-                r_squared = torch.where(torch.isnan(r_squared), torch.tensor(float('-inf')), r_squared)
-                r_squared = torch.where(r_squared >= 1, torch.tensor(float('-inf')), r_squared)
-
-                # Replace singular feature indices with negative infinity
-                if batch_id in self.unusable_features:
-                    for singular_ind in self.unusable_features[batch_id]:
-                        r_squared[singular_ind] = float('-inf')
-
-                
-                if join_key in self.aug_seller_feature_ind and batch_id in self.aug_seller_feature_ind[join_key]:
-                    exclude_indices = self.aug_seller_feature_ind[join_key][batch_id]
-                    # Temporarily set the values at the excluded indices to negative infinity
-                    original_values = r_squared[exclude_indices].clone()
-                    r_squared[exclude_indices] = float('-inf')
-                    # Find the index of the maximum value
-                    max_r2_index = torch.argmax(r_squared)
-
-                    if r_squared[max_r2_index].item() < -1:
-                        # This means that all the features have been selected
-                        r_squared[exclude_indices] = original_values
-                        continue
-
-                    # Restore the original values at the excluded indices
-                    r_squared[exclude_indices] = original_values
+                cached_sketches = self._seller_cache.get((join_key, batch_id))
+                if cached_sketches is None:
+                    cached_sketches = search_sketch_base.get_sketch_loader().get_sketches(batch_id)
+                    self._seller_cache[(join_key, batch_id)] = cached_sketches
+                seller_1, seller_x, seller_x_x, _ = cached_sketches
+                if self._streams:
+                    # Round-robin the batches over the side streams so their
+                    # kernels overlap; each stream first waits for the H2D
+                    # fetch issued on the current stream
+                    stream_idx = batch_id % len(self._streams)
+                    stream = self._streams[stream_idx]
+                    stream.wait_stream(torch.cuda.current_stream())
+                    if not self.fit_by_residual:
+                        # buyer_mat is allocated on the default stream but its
+                        # only reference is rebound at the next join key, before
+                        # the final synchronize; tell the caching allocator it
+                        # is still in use on this side stream so its blocks
+                        # aren't recycled under the in-flight matmuls
+                        buyer_mat.record_stream(stream)
+                    stream_ctx = torch.cuda.stream(stream)
                 else:
-                    # Find the index of the maximum value
-                    max_r2_index = torch.argmax(r_squared)
-                # max_r2_index = torch.argmax(r_squared)
-                if r_squared[max_r2_index].item() > best_r_squared:
-                    best_r_squared = r_squared[max_r2_index].item()
-                    best_r_squared_ind = max_r2_index
-                    best_batch_id = batch_id
-                    best_join_key = join_key
-                if not self.fit_by_residual:
-                    cleanup(x_x, x, c, y, y_y, inverses, res, TSS,
-                            RSS, r_squared, seller_1, seller_x, seller_x_x)
-                else:
-                    cleanup(x_x, x, c, y, y_y, x_y, x_mean, y_mean, S_xx, S_xy, TSS,
-                            RSS, r_squared, slope, intercept, seller_1, seller_x, seller_x_x)
+                    stream_idx = 0
+                    stream_ctx = nullcontext()
+                with stream_ctx:
+                    if not self.fit_by_residual:
+                        # Three GEMMs produce every moment the normal equations
+                        # need, replacing O(d^2) small torch.sum launches per
+                        # batch: m_1 holds [c | y_i | y_y_i | pair sums] against
+                        # the count layer, m_x holds [x | x_y_i] against seller_x
+                        m_1 = buyer_mat.t() @ seller_1.to(torch.float32)
+                        m_x = buyer_mat[:, :1 + d].t() @ seller_x.to(torch.float32)
+                        x_x = buyer_mat[:, 0] @ seller_x_x.to(torch.float32)
+
+                        c = m_1[0]
+                        x = m_x[0]
+                        x_x = torch.where(x_x == 0, torch.ones_like(x_x), x_x)
+                        y_rows = m_1[1:1 + d]
+                        y_y_rows = m_1[1 + d:1 + 2 * d]
+                        pair_rows = m_1[1 + 2 * d:]
+                        x_y_rows = m_x[1:]
+                        y = y_rows[y_ind]
+                        y_y = y_y_rows[y_ind]
+                        TSS = y_y - y * y / c
+
+                        XTX = self._moment_buffer(("XTX", stream_idx), (seller_x.shape[1], d+1, d+1))
+                        XTY = self._moment_buffer(("XTY", stream_idx), (seller_x.shape[1], d+1, 1))
+                        XTX[:, 0, 0] = c
+                        XTX[:, 0, 1] = XTX[:, 1, 0] = x
+                        XTX[:, 1, 1] = x_x
+                        XTY[:, 0, 0] = y
+                        XTY[:, 1, 0] = x_y_rows[y_ind]
+
+                        # Non-target buyer features: diagonal, first-column and
+                        # seller-row entries land via one indexed copy each
+                        others = scatter["others"]
+                        pos_others = scatter["pos_others"]
+                        y_y_others = y_y_rows[others]
+                        y_y_others = torch.where(y_y_others == 0, torch.ones_like(y_y_others), y_y_others)
+                        XTX[:, pos_others, pos_others] = y_y_others.t()
+                        XTX[:, 0, pos_others] = XTX[:, pos_others, 0] = y_rows[others].t()
+                        XTX[:, 1, pos_others] = XTX[:, pos_others, 1] = x_y_rows[others].t()
+
+                        # Pairwise products: pairs containing the target go to
+                        # XTY, the rest mirror into the XTX off-diagonals
+                        if scatter["xty_pair_pos"].numel():
+                            XTY[:, scatter["xty_pair_rows"], 0] = pair_rows[scatter["xty_pair_pos"]].t()
+                        if scatter["xtx_pair_pos"].numel():
+                            pair_vals = pair_rows[scatter["xtx_pair_pos"]].t()
+                            XTX[:, scatter["xtx_pair_i"], scatter["xtx_pair_j"]] = pair_vals
+                            XTX[:, scatter["xtx_pair_j"], scatter["xtx_pair_i"]] = pair_vals
+
+                        # One batched LU factorization solves every system at
+                        # once; singular matrices surface through the info tensor
+                        # instead of per-matrix try/except. Flagged slices are
+                        # swapped for the identity so the batched solve runs
+                        # exception-free, then their solutions are zeroed, which
+                        # matches the old zero-inverse fallback.
+                        LU, pivots, info = torch.linalg.lu_factor_ex(XTX, check_errors=False)
+                        singular_mask = info != 0
+                        if singular_mask.any():
+                            singular_inds = singular_mask.nonzero(as_tuple=True)[0]
+                            _, singular_names = search_sketch_base.get_dfs_by_feature_indices(
+                                batch_id, singular_inds.cpu().numpy())
+                            for name in singular_names:
+                                print(f"[Warning] Singular matrix at batch {batch_id}, corresponding to feature {name}")
+                            self.unusable_features[batch_id] = (
+                                self.unusable_features.get(batch_id, []) + singular_inds.tolist())
+                            self._exclusion_mask(join_key, batch_id, seller_x.shape[1])[singular_inds] = True
+                            # The LU factors of the identity are the identity with
+                            # trivial (1-based) pivots
+                            LU[singular_inds] = torch.eye(d + 1, device=LU.device)
+                            pivots[singular_inds] = torch.arange(
+                                1, d + 2, dtype=pivots.dtype, device=pivots.device)
+
+                        res = torch.linalg.lu_solve(LU, pivots, XTY)
+                        if singular_mask.any():
+                            res[singular_mask] = 0
+                        # RSS = y_y + beta' XTX beta - 2 beta' XTY as two fused
+                        # reductions instead of (d+1)^2 elementwise kernels
+                        beta = res.squeeze(-1)
+                        RSS = (y_y
+                               + torch.einsum('bi,bij,bj->b', beta, XTX, beta)
+                               - 2 * torch.einsum('bi,bi->b', beta, XTY.squeeze(-1)))
+                        r_squared = 1 - RSS / TSS
+                    else:
+                        # TODO: might be singular, how to deal with it
+                        # Upcast once so the reductions over bf16 sketch storage
+                        # accumulate in fp32; the upcast fuses into the load
+                        seller_1_f = seller_1.to(torch.float32)
+                        seller_x_f = seller_x.to(torch.float32)
+                        buyer_1_f = buyer_1.to(torch.float32)
+                        buyer_y_f = buyer_y.to(torch.float32)
+                        x_x = torch.sum(seller_x_x.to(torch.float32) * buyer_1_f, dim=0)
+                        x = torch.sum(seller_x_f * buyer_1_f, dim=0)
+                        c = torch.sum(buyer_1_f * seller_1_f, dim=0)
+
+                        x_y = torch.sum(seller_x_f * buyer_y_f, dim=0)
+                        y_y = torch.sum(buyer_y_y.to(torch.float32) * seller_1_f, dim=0)
+                        y = torch.sum(buyer_y_f * seller_1_f, dim=0)
+
+                        # Calculate means
+                        x_mean = x / c
+                        y_mean = y / c
+
+                        # Calculate the components needed for the formulas
+                        # Sum of squares of deviations is often denoted as S_xx (for x) and S_yy (for y)
+                        # and sum of cross-deviations as S_xy
+                        S_xx = x_x - 2 * x_mean * x + c * x_mean ** 2
+                        S_xy = x_y - x_mean * y - x * y_mean + c * x_mean * y_mean
+
+                        # Calculate regression coefficients, i.e., slope and intercept for each set
+                        # Formula for the slope (beta or m): S_xy / S_xx
+                        # Formula for the intercept (alpha or c): y_mean - m * x_mean
+                        slope = S_xy / S_xx
+                        intercept = y_mean - slope * x_mean
+
+                        TSS = y_y - 2 * y_mean * y + c * y_mean ** 2
+                        RSS = y_y + c * intercept ** 2 + slope ** 2 * x_x - 2 * \
+                            (slope * x_y + intercept * y - slope * intercept * x)
+
+                        # Calculate R² value for each regression model
+                        # R² = 1 - (RSS / TSS)
+                        r_squared = 1 - (RSS / TSS)
+                    # Blank out NaN and degenerate (>= 1) R² values in one
+                    # fused in-place pass instead of two torch.where kernels
+                    r_squared = r_squared.masked_fill_(
+                        torch.isnan(r_squared) | (r_squared >= 1), float('-inf'))
+
+                    # Blank out singular and already-selected features with one
+                    # fused fill from the persistent mask; no clone/restore dance
+                    excluded = self._excluded_masks.get((join_key, batch_id))
+                    if excluded is not None:
+                        if excluded.shape[0] < r_squared.shape[0]:
+                            excluded = self._exclusion_mask(join_key, batch_id, r_squared.shape[0])
+                        r_squared = r_squared.masked_fill(excluded[:r_squared.shape[0]], float('-inf'))
+                    # Write this batch's winner into its slot without
+                    # synchronizing; a fully excluded batch leaves -inf behind
+                    # and never wins
+                    max_val, max_r2_index = torch.max(r_squared, dim=0)
+                    batch_vals[len(batch_meta)] = max_val
+                    batch_inds[len(batch_meta)] = max_r2_index
+                    batch_meta.append((join_key, batch_id))
+                    if not self.fit_by_residual:
+                        cleanup(x_x, x, c, y, y_y, LU, pivots, info, res, TSS,
+                                RSS, r_squared, seller_1, seller_x, seller_x_x)
+                    else:
+                        cleanup(x_x, x, c, y, y_y, x_y, x_mean, y_mean, S_xx, S_xy, TSS,
+                                RSS, r_squared, slope, intercept, seller_1, seller_x, seller_x_x)
                     
-        if best_r_squared_ind == -1:
+        if not batch_meta:
             return None, None, None
-        else: 
-            print("Maximum R² value:", best_r_squared)
-            
-            return best_join_key, best_r_squared_ind.item(), best_batch_id
+        if self._streams:
+            # Everything after the fetches ran on side streams; one global
+            # sync before the winners are read back
+            torch.cuda.synchronize()
+        # The only host syncs of the iteration
+        best_val, winner_tensor = torch.max(batch_vals[:len(batch_meta)], dim=0)
+        best_r_squared = float(best_val)
+        if best_r_squared <= 0:
+            # Nothing beat the no-augmentation baseline (or everything was
+            # excluded), same outcome as the old best_r_squared_ind == -1
+            return None, None, None
+        winner = int(winner_tensor)
+        best_join_key, best_batch_id = batch_meta[winner]
+        print("Maximum R² value:", best_r_squared)
+
+        return best_join_key, int(batch_inds[winner]), best_batch_id
         
     """
     This function is used to start the search engine. It will iterate through the search_one_iteration function
@@ -969,56 +1648,83 @@ class SearchEngine():
             if not join_key:
                 print("No more good features")
                 break
-            if join_key not in self.aug_seller_feature_ind:
-                self.aug_seller_feature_ind[join_key] = {
-                    batch_id: torch.tensor([ind])}
-            elif batch_id not in self.aug_seller_feature_ind[join_key]:
-                self.aug_seller_feature_ind[join_key][batch_id] = torch.tensor([
-                                                                               ind])
-            else:
-                self.aug_seller_feature_ind[join_key][batch_id] = torch.cat(
-                    (self.aug_seller_feature_ind[join_key][batch_id], torch.tensor([ind])))
+            # Plain int lists: appending is O(1) instead of re-copying a
+            # device tensor with torch.cat every iteration
+            self.aug_seller_feature_ind.setdefault(join_key, {}).setdefault(batch_id, []).append(ind)
+            # Exclude the chosen feature from future iterations; the mask is
+            # an inference tensor, so re-enter inference mode to mutate it
+            with torch.inference_mode():
+                self._exclusion_mask(join_key, batch_id, ind + 1)[ind] = True
             seller_id, best_feature = self.data_market.get_seller_sketch_base_by_keys(join_key).get_df_by_feature_index(
                 batch_id, ind)
             print("The best feature in iter ", i, " is:", best_feature, "with join key ", join_key)
             self.augplan.append((seller_id, 
                                  i+1, 
-                                 self.data_market.seller_id_to_df_and_name[seller_id]["name"],
+                                 self.data_market.seller_name(seller_id),
                                  best_feature))
             self._update_residual(join_key, seller_id, best_feature)
         return self.augplan, self.augplan_acc, self.data_market.buyer_dataset if not self.fit_by_residual else self.data_market.buyer_dataset_for_residual
             
     def _update_residual(self, join_key, seller_id, best_feature):
-        buyer = self.data_market.buyer_id_to_df_and_name[0]["dataframe"]
+        buyer = self.data_market.buyer_df(0)
         if self.fit_by_residual:
             buyer = self.data_market.buyer_dataset_for_residual
-        seller_df = self.data_market.get_seller_sketch_by_keys(join_key=join_key, seller_id=seller_id).get_df()[[join_key, best_feature]]
-
-        # Pre-aggregate seller_df by join keys
-        
-        aggregation_functions = {col: 'mean' for col in seller_df.columns if col != join_key}
-        seller_df_agg = seller_df.groupby(join_key).agg(aggregation_functions).reset_index()
-
-        
-        # left join buyer_df with seller_df_agg on join key
-        joined_df = pd.merge(buyer, seller_df_agg, how='left', left_on=join_key, right_on=join_key, suffixes=('_left', '_right'))
-        # Remove the _right columns and rename the _left columns to the original column names
-        joined_df = joined_df[[col for col in joined_df.columns if '_right' not in col]]
-        joined_df.columns = [col.replace('_left', '') for col in joined_df.columns]
-        
-        # Fill in nulls in the new features with the mean of their columns
-        for col in seller_df_agg.columns:
-            if col != join_key:
-                joined_df[col].fillna(joined_df[col].mean(), inplace=True)
-
-        updated_buyer = joined_df[list(set([join_key] + list(buyer.columns) + [best_feature] + [self.buyer_target]))]
+        seller_df = self.data_market.get_seller_sketch_by_keys(join_key=join_key, seller_id=seller_id).get_df()
+
+        # Segmented mean of the chosen feature per join-key value: factorize
+        # the keys once and let two bincounts do the aggregation, instead of a
+        # hash groupby plus a left merge plus per-column fillna every iteration
+        seller_vals = seller_df[best_feature].to_numpy(dtype=np.float64)
+        codes, uniques = pd.factorize(seller_df[join_key])
+        # Keys the seller doesn't cover fall back to the mean over the matched
+        # buyer rows, matching the old post-merge fillna(mean)
+        buyer_codes = pd.Index(uniques).get_indexer(buyer[join_key])
+        if numba is not None:
+            # Single fused native pass over seller then buyer rows
+            mapped = _segment_mean_map_kernel(
+                codes.astype(np.int64), seller_vals,
+                buyer_codes.astype(np.int64), len(uniques))
+        else:
+            # Drop NaN values and NaN join keys (factorize codes them as -1,
+            # which bincount rejects) like the old groupby mean did
+            valid = (codes >= 0) & ~np.isnan(seller_vals)
+            sums = np.bincount(codes[valid], weights=seller_vals[valid], minlength=len(uniques))
+            counts = np.bincount(codes[valid], minlength=len(uniques))
+            means = sums / np.maximum(counts, 1)
+            means[counts == 0] = np.nan
+            mapped = np.where(buyer_codes >= 0, means[np.clip(buyer_codes, 0, None)], np.nan)
+            missing = np.isnan(mapped)
+            if missing.any() and not missing.all():
+                mapped[missing] = mapped[~missing].mean()
+
+        updated_buyer = buyer.copy(deep=False)
+        updated_buyer[best_feature] = mapped
 
         # Update the buyer sketch
         buy_keys = self.data_market.buyer_join_keys
         join_key_domain = self.data_market.buyer_sketches[join_key]["join_key_domain"]
 
-        self.data_market.set_buyer_id(0)
-        self.data_market.reset_buyer_sketches()
-        self.data_market.reset_buyer_id_to_df_and_name()
-        self.data_market.register_buyer(updated_buyer, buy_keys,
-                                        join_key_domain, self.buyer_target, fit_by_residual=self.fit_by_residual)
+        if self.fit_by_residual:
+            # The residual path rewrites the target column wholesale, so the
+            # sketch genuinely changes and a full re-registration is needed
+            self.data_market.set_buyer_id(0)
+            self.data_market.reset_buyer_sketches()
+            self.data_market.reset_buyer_id_to_df_and_name()
+            self.data_market.register_buyer(updated_buyer, buy_keys,
+                                            join_key_domain, self.buyer_target, fit_by_residual=self.fit_by_residual)
+        else:
+            # Only one column was appended: update each join key's sketch
+            # incrementally instead of recalibrating every buyer feature
+            X = list(updated_buyer.columns.difference([self.buyer_target] + buy_keys))
+            _, r2 = linear_regression_residuals(
+                updated_buyer, X_columns=X, Y_column=self.buyer_target, adjusted=False)
+            self.data_market.augplan_acc.append(r2)
+            # linear_regression_residuals writes a residuals column into the
+            # frame in place; drop it before storing, mirroring register_buyer,
+            # so later iterations don't regress on a column collinear with y
+            updated_buyer = updated_buyer.drop(columns=["residuals"], errors="ignore")
+            self.data_market.buyer_dataset = updated_buyer
+            self.data_market.set_buyer_df(0, updated_buyer)
+            for buy_key in buy_keys:
+                self.data_market.buyer_sketches[buy_key]["buyer_sketch"].add_feature(
+                    updated_buyer, best_feature)